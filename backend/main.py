@@ -1,17 +1,26 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
+from collections import defaultdict
 import os
 import uuid
-import shutil
+import time
+import asyncio
+import threading
+import aiofiles
+import orjson
+from cachetools import Cache, LRUCache
 from dotenv import load_dotenv
 import logging
 
 from utils.document_loader import DocumentLoader
 from utils.text_chunker import TextChunker
 from utils.embeddings import EmbeddingGenerator, OllamaClient
-from utils.vector_store import VectorStore
+from utils.vector_store import VectorStore, SAVE_INTERVAL
+from utils.semantic_cache import SemanticCache
+from utils.batched_searcher import BatchedSearcher
 
 # Load environment variables
 load_dotenv()
@@ -23,6 +32,18 @@ logger = logging.getLogger(__name__)
 # Initialize FastAPI app
 app = FastAPI(title="RAG Application API", version="1.0.0")
 
+
+class _OrjsonResponse(JSONResponse):
+    """
+    JSON response rendered with orjson, for large untyped listing endpoints.
+    
+    Endpoints with a response_model are left to FastAPI, which serializes them
+    with Pydantic directly and deprecates ORJSONResponse for that reason.
+    """
+    
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -38,6 +59,17 @@ FAISS_PERSIST_DIR = os.getenv("FAISS_PERSIST_DIRECTORY", "./faiss_db")
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama2")
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", 10485760))  # 10MB default
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "st")  # "st", "onnx" or "ollama"
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1MB read size when streaming uploads to disk
+NO_RESULTS_ANSWER = "I couldn't find any relevant information in the uploaded documents to answer your question."
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", 0))  # Torch CPU threads; 0 = usable CPUs minus one
+INDEX_TYPE = os.getenv("INDEX_TYPE", "auto")  # "auto", "flat", "fp16", "sq8", "hnsw" or "ivfpq"
+BINARY_RERANK = os.getenv("BINARY_RERANK", "false").lower() == "true"
+MAX_VECTOR_STORES = int(os.getenv("MAX_VECTOR_STORES", 32))  # Collections kept loaded in memory
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.97))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", 1000))
 
 # Create upload directory
 os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -45,20 +77,202 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # Initialize components
 document_loader = DocumentLoader()
 text_chunker = TextChunker(chunk_size=1000, chunk_overlap=200)
-embedding_generator = EmbeddingGenerator()
+embedding_generator = EmbeddingGenerator(
+    batch_size=EMBEDDING_BATCH_SIZE,
+    num_threads=EMBEDDING_THREADS,
+    backend=EMBEDDING_BACKEND,
+    ollama_url=OLLAMA_BASE_URL,
+    ollama_model=OLLAMA_EMBED_MODEL
+)
 ollama_client = OllamaClient(base_url=OLLAMA_BASE_URL, model=OLLAMA_MODEL)
 
-# Cache for vector stores by collection name
-vector_stores = {}
+class _VectorStoreCache(LRUCache):
+    """LRU cache of vector stores that flushes unsaved chunks before unloading a store."""
+    
+    def popitem(self):
+        collection_name, vector_store = super().popitem()
+        vector_store.flush()
+        return collection_name, vector_store
+    
+    def snapshot(self) -> Dict[str, VectorStore]:
+        """Get all cached stores without refreshing their LRU position."""
+        return {name: Cache.__getitem__(self, name) for name in list(self)}
+
+
+# Cache for vector stores by collection name; least recently used stores are
+# unloaded once the cap is reached
+vector_stores = _VectorStoreCache(maxsize=MAX_VECTOR_STORES)
+_vs_lock = threading.Lock()
 
 def get_vector_store(collection_name: str = "default") -> VectorStore:
     """Get or create a vector store for a specific collection."""
-    if collection_name not in vector_stores:
-        vector_stores[collection_name] = VectorStore(
-            persist_directory=FAISS_PERSIST_DIR,
-            collection_name=collection_name
+    with _vs_lock:
+        vector_store = vector_stores.get(collection_name)
+    if vector_store is not None:
+        return vector_store
+    
+    # Load outside the lock so different collections can load in parallel
+    vector_store = VectorStore(
+        persist_directory=FAISS_PERSIST_DIR,
+        collection_name=collection_name,
+        # Saved indexes carry their own dimension and an empty one adopts the
+        # dimension of its first embeddings, so don't block on probing Ollama
+        dimension=embedding_generator.dimension or 384,
+        index_type=INDEX_TYPE,
+        binary_rerank=BINARY_RERANK
+    )
+    with _vs_lock:
+        # Another caller may have loaded the same collection meanwhile; keep theirs
+        existing = vector_stores.get(collection_name)
+        if existing is not None:
+            return existing
+        vector_stores[collection_name] = vector_store
+    return vector_store
+
+def _is_loaded(collection_name: str, vector_store: VectorStore) -> bool:
+    """Check whether vector_store is still the cached store for its collection."""
+    with _vs_lock:
+        return collection_name in vector_stores and Cache.__getitem__(vector_stores, collection_name) is vector_store
+
+def _loaded_vector_stores() -> Dict[str, VectorStore]:
+    """Get a snapshot of the vector stores currently in memory."""
+    with _vs_lock:
+        return vector_stores.snapshot()
+
+# Serializes changes to each collection; deletes that rebuild an index wait in a
+# worker thread, and no add or reset may land on the store meanwhile
+_write_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+def _unload_vector_store(collection_name: Optional[str] = None):
+    """
+    Drop a collection's store from memory, or all stores if none is given.
+    
+    Unlike eviction this never flushes, since callers unload stores they have
+    just reset; clear() would go through popitem and write them back.
+    """
+    with _vs_lock:
+        names = list(vector_stores) if collection_name is None else [collection_name]
+        for name in names:
+            if name in vector_stores:
+                del vector_stores[name]
+
+
+# Coalesces concurrent /query searches on the same collection into one FAISS call
+batched_searcher = BatchedSearcher(
+    lambda collection_name, embeddings, n_results: get_vector_store(collection_name).query_batch(embeddings, n_results)
+)
+
+
+# Cache of answered queries by collection name
+response_caches = {}
+
+def get_response_cache(collection_name: str, dimension: int) -> SemanticCache:
+    """Get or create the semantic answer cache for a specific collection."""
+    if collection_name not in response_caches:
+        response_caches[collection_name] = SemanticCache(
+            dimension=dimension,
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            max_entries=SEMANTIC_CACHE_SIZE
         )
-    return vector_stores[collection_name]
+    return response_caches[collection_name]
+
+def _invalidate_response_cache(collection_name: Optional[str] = None):
+    """Drop cached answers for a collection, or for all collections if none is given."""
+    if collection_name is None:
+        response_caches.clear()
+    else:
+        response_caches.pop(collection_name, None)
+
+
+def _chunk_preview(text: str) -> str:
+    """Get the short preview shown for a chunk in listings."""
+    return text[:100] + "..." if len(text) > 100 else text
+
+
+def _cleanup_files(directory: str, prefix: str = "") -> List[str]:
+    """Delete regular files in a directory whose names start with prefix; returns their names."""
+    removed = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.startswith(prefix) and entry.is_file():
+                os.remove(entry.path)
+                removed.append(entry.name)
+    return removed
+
+
+# Short-lived cache of per-collection chunk counts
+COLLECTION_INFO_TTL = 5.0  # seconds
+_collections_cache = {"ts": 0.0, "val": None}
+
+def _cached_collection_info() -> Dict[str, int]:
+    """Get collection info, re-reading the persist directory at most every few seconds."""
+    now = time.monotonic()
+    if _collections_cache["val"] is None or now - _collections_cache["ts"] >= COLLECTION_INFO_TTL:
+        collections_info = VectorStore.get_collection_info(FAISS_PERSIST_DIR)
+        # Loaded stores may hold chunks that haven't been flushed to disk yet
+        for name, vector_store in _loaded_vector_stores().items():
+            count = vector_store.get_collection_count()
+            if count or name in collections_info:
+                collections_info[name] = count
+        _collections_cache["val"] = collections_info
+        _collections_cache["ts"] = now
+    return _collections_cache["val"]
+
+def _invalidate_collection_info():
+    """Force the next collection info lookup to hit the disk."""
+    _collections_cache["ts"] = 0.0
+    _collections_cache["val"] = None
+
+
+# Background task that saves pending vector store changes
+_flush_task: Optional[asyncio.Task] = None
+
+
+@app.on_event("startup")
+async def warmup():
+    """Load persisted collections so the first query doesn't pay the load cost."""
+    start = time.perf_counter()
+    # Only as many as the cache holds, most recently written first; the rest
+    # would be evicted again during warmup
+    names = sorted(
+        VectorStore.list_collections(FAISS_PERSIST_DIR),
+        key=lambda name: os.path.getmtime(os.path.join(FAISS_PERSIST_DIR, f"{name}.index")),
+        reverse=True
+    )[:MAX_VECTOR_STORES]
+    results = await asyncio.gather(
+        *[asyncio.to_thread(get_vector_store, name) for name in names],
+        return_exceptions=True
+    )
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to preload collection {name}: {result}")
+    logger.info(f"Preloaded {len(names)} collections in {time.perf_counter() - start:.2f}s")
+    
+    global _flush_task
+    _flush_task = asyncio.create_task(_flush_vector_stores_periodically())
+
+
+async def _flush_vector_stores_periodically():
+    """Write chunks that have been waiting for SAVE_INTERVAL seconds to disk."""
+    while True:
+        await asyncio.sleep(SAVE_INTERVAL / 2)
+        for name, vector_store in _loaded_vector_stores().items():
+            try:
+                vector_store.flush_if_stale()
+            except Exception as e:
+                logger.error(f"Error flushing collection {name}: {str(e)}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks, save pending chunks and release pooled HTTP connections on shutdown."""
+    if _flush_task is not None:
+        _flush_task.cancel()
+    for vector_store in _loaded_vector_stores().values():
+        vector_store.flush()
+    await batched_searcher.stop()
+    await ollama_client.close()
+    embedding_generator.close()
 
 
 # Pydantic models
@@ -104,10 +318,10 @@ async def root():
 async def health_check():
     """Check the health of the application and its dependencies."""
     try:
-        ollama_available = ollama_client.check_health()
+        ollama_available = await ollama_client.check_health()
         
         # Get all collections info
-        collections_info = VectorStore.get_collection_info(FAISS_PERSIST_DIR)
+        collections_info = _cached_collection_info()
         total_docs = sum(collections_info.values())
         
         return HealthResponse(
@@ -148,16 +362,30 @@ async def upload_document(file: UploadFile = File(...), collection: str = "defau
         file_extension = os.path.splitext(file.filename)[1]
         file_path = os.path.join(UPLOAD_DIR, f"{document_id}{file_extension}")
         
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Stream the upload to disk without blocking the event loop
+        bytes_written = 0
+        async with aiofiles.open(file_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                bytes_written += len(chunk)
+                if bytes_written > MAX_FILE_SIZE:
+                    break
+                await buffer.write(chunk)
+        
+        if bytes_written > MAX_FILE_SIZE:
+            os.remove(file_path)
+            raise HTTPException(
+                status_code=413,
+                detail=f"File exceeds maximum size of {MAX_FILE_SIZE} bytes"
+            )
         
         logger.info(f"Saved file: {file.filename} as {document_id}{file_extension}")
         
-        # Extract text based on file type
+        # Extract text based on file type, off the event loop
+        loop = asyncio.get_running_loop()
         if file.filename.lower().endswith('.pdf'):
-            text = document_loader.load_pdf(file_path)
+            text = await loop.run_in_executor(None, document_loader.load_pdf, file_path)
         else:
-            text = document_loader.load_text(file_path)
+            text = await loop.run_in_executor(None, document_loader.load_text, file_path)
         
         # Chunk the text
         chunks = text_chunker.chunk_text(text)
@@ -166,7 +394,8 @@ async def upload_document(file: UploadFile = File(...), collection: str = "defau
             raise HTTPException(status_code=400, detail="No text could be extracted from the document")
         
         # Generate embeddings
-        embeddings = embedding_generator.generate_embeddings(chunks)
+        # Encoding is blocking (CPU-bound, or an HTTP call for the Ollama backend)
+        embeddings = await loop.run_in_executor(None, embedding_generator.generate_embeddings, chunks)
         
         # Prepare metadata
         metadata = [
@@ -175,6 +404,7 @@ async def upload_document(file: UploadFile = File(...), collection: str = "defau
                 "filename": file.filename,
                 "chunk_index": i,
                 "text": chunk,
+                "preview": _chunk_preview(chunk),
                 "collection": collection
             }
             for i, chunk in enumerate(chunks)
@@ -183,16 +413,26 @@ async def upload_document(file: UploadFile = File(...), collection: str = "defau
         # Generate IDs for chunks
         chunk_ids = [f"{document_id}_chunk_{i}" for i in range(len(chunks))]
         
-        # Get or create vector store for this collection
-        vector_store = get_vector_store(collection)
+        # Store in vector database; when the collection outgrows its index, the
+        # new one is built in a worker thread so searches keep running
+        async with _write_locks[collection]:
+            while True:
+                # Get the store under the lock; if it is evicted during the build,
+                # changes to the unloaded instance would never be flushed, so retry
+                vector_store = get_vector_store(collection)
+                upgraded_index = await loop.run_in_executor(None, vector_store.build_upgraded_index, embeddings)
+                if _is_loaded(collection, vector_store):
+                    break
+            vector_store.add_documents(
+                texts=chunks,
+                embeddings=embeddings,
+                metadata=metadata,
+                ids=chunk_ids,
+                upgraded_index=upgraded_index
+            )
         
-        # Store in vector database
-        vector_store.add_documents(
-            texts=chunks,
-            embeddings=embeddings,
-            metadata=metadata,
-            ids=chunk_ids
-        )
+        _invalidate_collection_info()
+        _invalidate_response_cache(collection)
         
         logger.info(f"Successfully processed document: {file.filename} into collection: {collection}")
         
@@ -226,22 +466,30 @@ async def query_documents(request: QueryRequest):
         vector_store = get_vector_store(request.collection)
         
         # Generate embedding for the query
-        query_embedding = embedding_generator.generate_embeddings([request.query])[0]
+        query_embedding = await asyncio.to_thread(embedding_generator.generate_single, request.query.strip().lower())
+        
+        # Reuse the answer of a near-identical earlier query in this collection
+        response_cache = get_response_cache(request.collection, query_embedding.shape[1])
+        cached = response_cache.lookup(query_embedding)
+        if cached is not None and cached[0] == request.num_results:
+            logger.info(f"Answered query in collection '{request.collection}' from cache: {request.query[:50]}...")
+            return cached[1].model_copy(update={"query": request.query})
         
         # Search vector database
-        results = vector_store.query(
-            query_embedding=query_embedding,
-            n_results=request.num_results
+        results = await batched_searcher.submit(
+            request.collection,
+            query_embedding,
+            request.num_results
         )
         
         # Get total chunks in database
         total_chunks = vector_store.get_collection_count()
         
         # Extract relevant chunks
-        if not results['documents'] or not results['documents'][0]:
+        if not results['documents']:
             return QueryResponse(
                 query=request.query,
-                answer="I couldn't find any relevant information in the uploaded documents to answer your question.",
+                answer=NO_RESULTS_ANSWER,
                 sources=[],
                 num_sources=0,
                 total_chunks_in_db=total_chunks,
@@ -250,33 +498,38 @@ async def query_documents(request: QueryRequest):
                 collection_used=request.collection
             )
         
-        relevant_chunks = results['documents'][0]
-        metadatas = results.get('metadatas', [[]])[0]
-        distances = results.get('distances', [[]])[0]
-        
-        # Prepare source metadata with additional information
-        source_metadata = []
-        for i, (chunk, metadata, distance) in enumerate(zip(relevant_chunks, metadatas, distances)):
-            source_info = {
+        relevant_chunks = results['documents']
+        metadatas = results['metadatas']
+        distances = results['distances']
+        
+        # Prepare source metadata with additional information; scores are
+        # cosine similarities from the inner-product index (higher is closer)
+        source_defaults = {
+            "filename": "Unknown",
+            "document_id": "Unknown",
+            "chunk_index": -1,
+            "collection": request.collection
+        }
+        source_metadata = [
+            {
                 "chunk_number": i + 1,
+                **source_defaults,
+                **metadata,
                 "text": chunk,
-                "filename": metadata.get("filename", "Unknown"),
-                "document_id": metadata.get("document_id", "Unknown"),
-                "chunk_index": metadata.get("chunk_index", -1),
-                "similarity_score": float(distance) if distance else 0.0,
-                "collection": metadata.get("collection", request.collection)
+                "similarity_score": float(distance) if distance else 0.0
             }
-            source_metadata.append(source_info)
+            for i, (chunk, metadata, distance) in enumerate(zip(relevant_chunks, metadatas, distances))
+        ]
         
         # Generate answer using Ollama
-        answer = ollama_client.generate(
+        answer = await ollama_client.generate(
             prompt=request.query,
             context=relevant_chunks
         )
         
         logger.info(f"Successfully answered query in collection '{request.collection}': {request.query[:50]}... using {len(relevant_chunks)}/{total_chunks} chunks")
         
-        return QueryResponse(
+        response = QueryResponse(
             query=request.query,
             answer=answer,
             sources=relevant_chunks,
@@ -286,37 +539,86 @@ async def query_documents(request: QueryRequest):
             source_metadata=source_metadata,
             collection_used=request.collection
         )
+        
+        # Ollama errors are returned as answers starting with a warning sign; don't cache those
+        if not answer.startswith("⚠️"):
+            response_cache.add(query_embedding, (request.num_results, response))
+        
+        return response
     
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
 
+@app.post("/query/stream", tags=["Query"])
+async def query_documents_stream(request: QueryRequest):
+    """
+    Query the document database and stream the answer as plain text.
+    
+    Uses the same retrieval as /query, but sends answer text as Ollama
+    generates it instead of waiting for the full response.
+    
+    Args:
+        request: Query request containing the question, number of results, and collection name
+    """
+    try:
+        # Generate embedding for the query
+        query_embedding = await asyncio.to_thread(embedding_generator.generate_single, request.query.strip().lower())
+        
+        # Search vector database
+        results = await batched_searcher.submit(
+            request.collection,
+            query_embedding,
+            request.num_results
+        )
+    except Exception as e:
+        logger.error(f"Error processing query: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+    
+    relevant_chunks = results['documents']
+    if not relevant_chunks:
+        return StreamingResponse(iter([NO_RESULTS_ANSWER]), media_type="text/plain; charset=utf-8")
+    
+    logger.info(f"Streaming answer for query in collection '{request.collection}': {request.query[:50]}... using {len(relevant_chunks)} chunks")
+    return StreamingResponse(
+        ollama_client.generate_stream(prompt=request.query, context=relevant_chunks),
+        media_type="text/plain; charset=utf-8"
+    )
+
+
 @app.delete("/documents", tags=["Documents"])
 async def delete_all_documents(collection: Optional[str] = None):
     """Delete all documents from the vector database or a specific collection."""
     try:
         if collection:
             # Delete specific collection
-            vector_store = get_vector_store(collection)
-            vector_store.reset_collection()
-            if collection in vector_stores:
-                del vector_stores[collection]
+            async with _write_locks[collection]:
+                vector_store = get_vector_store(collection)
+                vector_store.reset_collection()
+                _unload_vector_store(collection)
+            _invalidate_response_cache(collection)
             message = f"Collection '{collection}' deleted successfully"
         else:
-            # Delete all collections
+            # Reset the collections saved on disk. Loaded stores without files (only
+            # looked up, or not flushed yet) are unloaded instead, since resetting
+            # would write files for them; do it before the first await so the
+            # periodic flush can't save them meanwhile
             collections = VectorStore.list_collections(FAISS_PERSIST_DIR)
+            for coll_name in set(_loaded_vector_stores()) - set(collections):
+                _unload_vector_store(coll_name)
             for coll_name in collections:
-                vs = get_vector_store(coll_name)
-                vs.reset_collection()
-            vector_stores.clear()
+                async with _write_locks[coll_name]:
+                    vs = get_vector_store(coll_name)
+                    vs.reset_collection()
+            _unload_vector_store()
+            _invalidate_response_cache()
             message = "All collections deleted successfully"
         
+        _invalidate_collection_info()
+        
         # Clean up uploaded files
-        for file in os.listdir(UPLOAD_DIR):
-            file_path = os.path.join(UPLOAD_DIR, file)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
+        await asyncio.to_thread(_cleanup_files, UPLOAD_DIR)
         
         logger.info(message)
         return {"message": message}
@@ -331,7 +633,7 @@ async def get_stats():
     """Get statistics about the document database."""
     try:
         # Get all collections info
-        collections_info = VectorStore.get_collection_info(FAISS_PERSIST_DIR)
+        collections_info = _cached_collection_info()
         total_chunks = sum(collections_info.values())
         
         # Count uploaded files
@@ -353,7 +655,7 @@ async def get_stats():
 async def list_collections():
     """List all available collections/partitions."""
     try:
-        collections_info = VectorStore.get_collection_info(FAISS_PERSIST_DIR)
+        collections_info = _cached_collection_info()
         return {
             "collections": collections_info,
             "total_collections": len(collections_info),
@@ -385,11 +687,12 @@ async def get_collection_info(collection_name: str):
 async def delete_collection(collection_name: str):
     """Delete a specific collection."""
     try:
-        vector_store = get_vector_store(collection_name)
-        vector_store.reset_collection()
-        
-        if collection_name in vector_stores:
-            del vector_stores[collection_name]
+        async with _write_locks[collection_name]:
+            vector_store = get_vector_store(collection_name)
+            vector_store.reset_collection()
+            _unload_vector_store(collection_name)
+        _invalidate_collection_info()
+        _invalidate_response_cache(collection_name)
         
         logger.info(f"Deleted collection: {collection_name}")
         return {"message": f"Collection '{collection_name}' deleted successfully"}
@@ -399,7 +702,7 @@ async def delete_collection(collection_name: str):
         raise HTTPException(status_code=500, detail=f"Error deleting collection: {str(e)}")
 
 
-@app.get("/collections/{collection_name}/documents", tags=["Documents"])
+@app.get("/collections/{collection_name}/documents", response_class=_OrjsonResponse, tags=["Documents"])
 async def list_documents_in_collection(collection_name: str):
     """List all documents in a specific collection with their chunks."""
     try:
@@ -413,31 +716,27 @@ async def list_documents_in_collection(collection_name: str):
                 "total_chunks": 0
             }
         
-        # Group chunks by document_id
-        documents_dict = {}
-        for metadata in vector_store.metadata_store:
-            doc_id = metadata.get("document_id", "unknown")
-            if doc_id not in documents_dict:
-                documents_dict[doc_id] = {
-                    "document_id": doc_id,
-                    "filename": metadata.get("filename", "Unknown"),
-                    "collection": collection_name,
-                    "chunks": []
+        # Build each document from its chunk positions
+        documents = []
+        for doc_id in vector_store.get_document_ids():
+            doc_metadata = [vector_store.metadata_store[i] for i in vector_store.get_document_indices(doc_id)]
+            chunks = [
+                {
+                    "chunk_index": metadata.get("chunk_index", -1),
+                    "text": metadata.get("text", ""),
+                    "preview": metadata.get("preview") or _chunk_preview(metadata.get("text", ""))
                 }
-            
-            documents_dict[doc_id]["chunks"].append({
-                "chunk_index": metadata.get("chunk_index", -1),
-                "text": metadata.get("text", ""),
-                "preview": metadata.get("text", "")[:100] + "..." if len(metadata.get("text", "")) > 100 else metadata.get("text", "")
+                for metadata in doc_metadata
+            ]
+            chunks.sort(key=lambda x: x["chunk_index"])
+            documents.append({
+                "document_id": doc_id,
+                "filename": doc_metadata[0].get("filename", "Unknown"),
+                "collection": collection_name,
+                "chunks": chunks,
+                "num_chunks": len(chunks)
             })
         
-        # Convert to list and sort chunks
-        documents = []
-        for doc in documents_dict.values():
-            doc["chunks"].sort(key=lambda x: x["chunk_index"])
-            doc["num_chunks"] = len(doc["chunks"])
-            documents.append(doc)
-        
         return {
             "collection_name": collection_name,
             "documents": documents,
@@ -450,7 +749,7 @@ async def list_documents_in_collection(collection_name: str):
         raise HTTPException(status_code=500, detail=f"Error listing documents: {str(e)}")
 
 
-@app.get("/collections/{collection_name}/documents/{document_id}", tags=["Documents"])
+@app.get("/collections/{collection_name}/documents/{document_id}", response_class=_OrjsonResponse, tags=["Documents"])
 async def get_document_details(collection_name: str, document_id: str):
     """Get detailed information about a specific document."""
     try:
@@ -459,21 +758,22 @@ async def get_document_details(collection_name: str, document_id: str):
         if not hasattr(vector_store, 'metadata_store') or not vector_store.metadata_store:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        # Find all chunks for this document
-        chunks = []
-        filename = None
-        for metadata in vector_store.metadata_store:
-            if metadata.get("document_id") == document_id:
-                if filename is None:
-                    filename = metadata.get("filename", "Unknown")
-                chunks.append({
-                    "chunk_index": metadata.get("chunk_index", -1),
-                    "text": metadata.get("text", "")
-                })
+        # Look up all chunks for this document
+        indices = vector_store.get_document_indices(document_id)
         
-        if not chunks:
+        if not indices:
             raise HTTPException(status_code=404, detail="Document not found")
         
+        doc_metadata = [vector_store.metadata_store[i] for i in indices]
+        filename = doc_metadata[0].get("filename", "Unknown")
+        chunks = [
+            {
+                "chunk_index": metadata.get("chunk_index", -1),
+                "text": metadata.get("text", "")
+            }
+            for metadata in doc_metadata
+        ]
+        
         # Sort by chunk index
         chunks.sort(key=lambda x: x["chunk_index"])
         
@@ -501,54 +801,37 @@ async def delete_document(collection_name: str, document_id: str):
         if not hasattr(vector_store, 'metadata_store') or not vector_store.metadata_store:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        # Find indices of chunks belonging to this document
-        indices_to_delete = []
-        chunks_to_delete = 0
-        filename = None
-        
-        for i, metadata in enumerate(vector_store.metadata_store):
-            if metadata.get("document_id") == document_id:
-                indices_to_delete.append(i)
-                chunks_to_delete += 1
-                if filename is None:
-                    filename = metadata.get("filename", "Unknown")
+        # Look up indices of chunks belonging to this document
+        indices_to_delete = vector_store.get_document_indices(document_id)
         
         if not indices_to_delete:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        # Delete from index (in reverse order to maintain indices)
-        import numpy as np
-        import faiss
-        
-        # Create new index without the deleted vectors
-        remaining_indices = [i for i in range(len(vector_store.metadata_store)) if i not in indices_to_delete]
-        
-        if remaining_indices:
-            # Get remaining vectors
-            remaining_vectors = np.array([vector_store.index.reconstruct(i) for i in remaining_indices])
-            remaining_metadata = [vector_store.metadata_store[i] for i in remaining_indices]
-            
-            # Create new index
-            dimension = vector_store.index.d
-            new_index = faiss.IndexFlatL2(dimension)
-            new_index.add(remaining_vectors)
-            
-            vector_store.index = new_index
-            vector_store.metadata_store = remaining_metadata
-        else:
-            # No remaining documents, reset collection
-            vector_store.reset_collection()
-        
-        # Save the updated index
-        vector_store._save_index()
+        chunks_to_delete = len(indices_to_delete)
+        filename = vector_store.metadata_store[indices_to_delete[0]].get("filename", "Unknown")
+        
+        # Remove the document's vectors and metadata from the collection; HNSW
+        # indexes are rebuilt in a worker thread so searches keep running
+        async with _write_locks[collection_name]:
+            while True:
+                # Re-fetch under the lock, as for uploads: the store may have been
+                # evicted while waiting, and deleting from a stale instance would
+                # later overwrite what a freshly loaded one saves
+                vector_store = get_vector_store(collection_name)
+                indices_to_delete = sorted(vector_store.get_document_indices(document_id))
+                if not indices_to_delete:
+                    # A concurrent request deleted it while this one waited for the lock
+                    raise HTTPException(status_code=404, detail="Document not found")
+                rebuilt_index = await asyncio.to_thread(vector_store.build_index_without, indices_to_delete)
+                if _is_loaded(collection_name, vector_store):
+                    break
+            vector_store.delete_document(document_id, rebuilt_index=rebuilt_index)
+        _invalidate_collection_info()
+        _invalidate_response_cache(collection_name)
         
         # Delete the uploaded file if it exists
-        for file in os.listdir(UPLOAD_DIR):
-            if file.startswith(document_id):
-                file_path = os.path.join(UPLOAD_DIR, file)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Deleted file: {file}")
+        for file in await asyncio.to_thread(_cleanup_files, UPLOAD_DIR, document_id):
+            logger.info(f"Deleted file: {file}")
         
         logger.info(f"Deleted document {document_id} ({filename}) with {chunks_to_delete} chunks from collection {collection_name}")
         
@@ -567,7 +850,7 @@ async def delete_document(collection_name: str, document_id: str):
         raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
 
 
-@app.get("/collections/{collection_name}/chunks", tags=["Chunks"])
+@app.get("/collections/{collection_name}/chunks", response_class=_OrjsonResponse, tags=["Chunks"])
 async def list_chunks(collection_name: str, limit: int = 100, offset: int = 0):
     """List all chunks in a collection with pagination."""
     try:
@@ -592,7 +875,7 @@ async def list_chunks(collection_name: str, limit: int = 100, offset: int = 0):
                 "filename": meta.get("filename", "Unknown"),
                 "chunk_index": meta.get("chunk_index", -1),
                 "text": meta.get("text", ""),
-                "preview": meta.get("text", "")[:100] + "..." if len(meta.get("text", "")) > 100 else meta.get("text", ""),
+                "preview": meta.get("preview") or _chunk_preview(meta.get("text", "")),
                 "collection": collection_name
             }
             for meta in chunks_slice
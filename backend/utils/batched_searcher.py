@@ -0,0 +1,119 @@
+import asyncio
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _PendingSearch:
+    """A single queued search waiting for its batch to run."""
+    
+    def __init__(self, key: str, embedding: np.ndarray, n_results: int, future: asyncio.Future):
+        self.key = key
+        self.embedding = embedding
+        self.n_results = n_results
+        self.future = future
+
+
+class BatchedSearcher:
+    """Coalesces concurrent vector searches into batched search calls."""
+    
+    def __init__(
+        self,
+        search_fn: Callable[[str, np.ndarray, int], List[Dict[str, Any]]],
+        max_wait: float = 0.005,
+        max_items: int = 32
+    ):
+        """
+        Initialize the batched searcher.
+        
+        Args:
+            search_fn: Called as search_fn(key, embeddings, n_results); must return
+                one result dictionary per embedding row, in order
+            max_wait: Maximum time in seconds to wait for more queries to join a batch
+            max_items: Maximum number of queries in a single batch
+        """
+        self.search_fn = search_fn
+        self.max_wait = max_wait
+        self.max_items = max_items
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    async def submit(self, key: str, embedding: np.ndarray, n_results: int) -> Dict[str, Any]:
+        """
+        Queue a search and wait for its result.
+        
+        Args:
+            key: Name of the collection to search
+            embedding: Query embedding, 1D or shape (1, dimension)
+            n_results: Number of results to return
+        
+        Returns:
+            Result dictionary in the same format as VectorStore.query
+        """
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingSearch(key, embedding, n_results, future))
+        return await future
+    
+    async def stop(self):
+        """Stop the background batching task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        """Collect queued searches into batches and run them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            
+            while len(batch) < self.max_items:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            self._flush(batch)
+    
+    def _flush(self, batch: List[_PendingSearch]):
+        """Run one search call per collection in the batch and resolve the futures."""
+        groups: Dict[str, List[_PendingSearch]] = {}
+        for item in batch:
+            groups.setdefault(item.key, []).append(item)
+        
+        for key, items in groups.items():
+            try:
+                embeddings = np.vstack([
+                    np.asarray(item.embedding, dtype=np.float32).reshape(1, -1) for item in items
+                ])
+                results = self.search_fn(key, embeddings, max(item.n_results for item in items))
+            except Exception as e:
+                for item in items:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+            
+            for item, result in zip(items, results):
+                if item.future.done():
+                    continue
+                # Each caller only gets as many hits as it asked for
+                item.future.set_result({
+                    name: values[:item.n_results] for name, values in result.items()
+                })
+            
+            if len(items) > 1:
+                logger.info(f"Batched {len(items)} searches in collection: {key}")
@@ -1,6 +1,6 @@
 import os
 from typing import List
-from PyPDF2 import PdfReader
+import pypdfium2 as pdfium
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -22,11 +22,21 @@ class DocumentLoader:
             Extracted text from the PDF
         """
         try:
-            reader = PdfReader(file_path)
-            text = ""
+            pdf = pdfium.PdfDocument(file_path)
+            pages = []
             
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
+            try:
+                for i in range(len(pdf)):
+                    page = pdf[i]
+                    textpage = page.get_textpage()
+                    pages.append(textpage.get_text_range())
+                    textpage.close()
+                    page.close()
+            finally:
+                pdf.close()
+            
+            # Join once instead of growing a string page by page
+            text = "\n".join(pages) + "\n"
             
             logger.info(f"Successfully extracted text from {file_path}")
             return text
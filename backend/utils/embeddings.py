@@ -1,30 +1,129 @@
-from typing import List
-import requests
+from typing import AsyncIterator, List, Optional, Tuple
+from functools import lru_cache
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import numpy as np
+import httpx
+import orjson
 import logging
+import torch
+from cachetools import LRUCache
 from sentence_transformers import SentenceTransformer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Seconds a health check result is reused before Ollama is probed again
+HEALTH_CHECK_TTL = 15.0
+
+
+def _configure_torch_threads(num_threads: Optional[int] = None):
+    """
+    Set the number of CPU threads torch uses for encoding.
+    
+    Args:
+        num_threads: Intra-op thread count; defaults to the usable CPUs minus one
+    """
+    if not num_threads:
+        # sched_getaffinity respects container cpusets, unlike os.cpu_count()
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 2)
+        num_threads = max(1, cpus - 1)
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(2)
+    except RuntimeError:
+        # Can only be set before torch starts its first parallel work
+        pass
+    logger.info(f"Using {num_threads} torch threads for embeddings")
+
+
+@lru_cache(maxsize=4)
+def _load_model(model_name: str, backend: str = "st") -> SentenceTransformer:
+    """Load a sentence transformer model once per process."""
+    if backend == "onnx":
+        # ONNX Runtime fuses the graph for faster CPU inference; the model is
+        # exported to ONNX on first load if the repo doesn't ship one
+        return SentenceTransformer(
+            model_name,
+            backend="onnx",
+            model_kwargs={"provider": "CPUExecutionProvider"}
+        )
+    return SentenceTransformer(model_name)
+
 
 class EmbeddingGenerator:
-    """Generates embeddings for text using sentence transformers."""
+    """Generates embeddings for text using sentence transformers or Ollama."""
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        cache_size: int = 1024,
+        text_cache_size: int = 50_000,
+        batch_size: int = 64,
+        num_threads: Optional[int] = None,
+        backend: str = "st",
+        ollama_url: str = "http://localhost:11434",
+        ollama_model: str = "nomic-embed-text"
+    ):
         """
         Initialize the embedding generator.
         
         Args:
             model_name: Name of the sentence transformer model to use
+            cache_size: Number of recent single-text embeddings to keep in memory
+            text_cache_size: Number of chunk embeddings to keep, keyed by content hash
+            batch_size: Number of texts per sentence transformer forward pass
+            num_threads: Torch CPU threads for the "st" backend; None or 0 picks
+                one less than the usable CPUs
+            backend: "st" for in-process sentence transformers, "onnx" for sentence
+                transformers on ONNX Runtime, "ollama" for Ollama's /api/embed
+            ollama_url: Base URL of Ollama API (ollama backend only)
+            ollama_model: Ollama embedding model name (ollama backend only)
         """
-        try:
-            self.model = SentenceTransformer(model_name)
-            logger.info(f"Loaded embedding model: {model_name}")
-        except Exception as e:
-            logger.error(f"Error loading embedding model: {str(e)}")
-            raise
+        if backend not in ("st", "onnx", "ollama"):
+            raise ValueError(f"Unknown embedding backend: {backend}")
+        
+        self.backend = backend
+        self.batch_size = batch_size
+        self.model = None
+        self.dimension: Optional[int] = None
+        self.max_seq_length: Optional[int] = None
+        
+        if backend == "ollama":
+            self.ollama_url = ollama_url
+            self.ollama_model = ollama_model
+            # Encoding is synchronous, so use a pooled sync client
+            self._client = httpx.Client(timeout=httpx.Timeout(60.0, connect=5.0))
+            logger.info(f"Using Ollama embedding model: {ollama_model}")
+        else:
+            try:
+                if backend == "st":
+                    _configure_torch_threads(num_threads)
+                self.model = _load_model(model_name, backend)
+                self.dimension = self.model.get_sentence_embedding_dimension()
+                self.max_seq_length = self.model.max_seq_length
+                logger.info(f"Loaded embedding model: {model_name} ({backend} backend)")
+            except Exception as e:
+                logger.error(f"Error loading embedding model: {str(e)}")
+                raise
+        
+        # Per-instance LRU cache so repeated queries skip the encoder
+        self._cached_encode = lru_cache(maxsize=cache_size)(self._encode_single)
+        # Content-hash cache so re-ingested chunks skip the encoder
+        self._text_cache: LRUCache = LRUCache(maxsize=text_cache_size)
+        # Callers encode from worker threads, and LRUCache isn't thread-safe
+        self._text_cache_lock = threading.Lock()
+    
+    def get_dimension(self) -> int:
+        """Get the embedding dimension, probing the Ollama model on first use."""
+        if self.dimension is None:
+            self._encode(["dimension probe"])
+        return self.dimension
     
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
         """
         Generate embeddings for a list of texts.
         
@@ -32,15 +131,102 @@ class EmbeddingGenerator:
             texts: List of text strings to embed
             
         Returns:
-            List of embedding vectors
+            2D float32 array with one embedding vector per row
         """
         try:
-            embeddings = self.model.encode(texts, show_progress_bar=True)
-            logger.info(f"Generated embeddings for {len(texts)} texts")
-            return embeddings.tolist()
+            keys = [self._text_key(text) for text in texts]
+            with self._text_cache_lock:
+                rows = [self._text_cache.get(key) for key in keys]
+            
+            # Encode each distinct uncached text once
+            misses = {}
+            for key, text, row in zip(keys, texts, rows):
+                if row is None and key not in misses:
+                    misses[key] = text
+            
+            if misses:
+                # Copy each row so a cached embedding doesn't keep its whole batch alive
+                encoded = {key: row.copy() for key, row in zip(misses, self._encode(list(misses.values())))}
+                with self._text_cache_lock:
+                    for key, row in encoded.items():
+                        row.flags.writeable = False
+                        self._text_cache[key] = row
+                rows = [encoded[key] if row is None else row for key, row in zip(keys, rows)]
+            
+            # vstack copies into a fresh array, so callers can't modify cached rows
+            embeddings = np.vstack(rows) if rows else np.empty((0, self.get_dimension()), dtype=np.float32)
+            
+            logger.info(
+                f"Generated embeddings for {len(texts)} texts "
+                f"({len(texts) - len(misses)} from cache)"
+            )
+            return embeddings
         except Exception as e:
             logger.error(f"Error generating embeddings: {str(e)}")
             raise
+    
+    def generate_single(self, text: str) -> np.ndarray:
+        """
+        Generate an embedding for a single text, reusing cached results.
+        
+        Args:
+            text: Text string to embed
+            
+        Returns:
+            Read-only 2D float32 array of shape (1, dimension)
+        """
+        try:
+            return self._cached_encode(text)
+        except Exception as e:
+            logger.error(f"Error generating embedding: {str(e)}")
+            raise
+    
+    def close(self):
+        """Close the Ollama HTTP connection pool, if one is open."""
+        if self.backend == "ollama":
+            self._client.close()
+    
+    @staticmethod
+    def _text_key(text: str) -> bytes:
+        """Hash a text into a compact cache key."""
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+    
+    def _encode_single(self, text: str) -> np.ndarray:
+        """Encode one text; wrapped by the LRU cache."""
+        embedding = self._encode([text])[0:1]
+        # Cached arrays are shared between callers, so guard against in-place edits
+        embedding.flags.writeable = False
+        return embedding
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Run the encoder and return a C-contiguous float32 array."""
+        if self.backend == "ollama":
+            return self._encode_ollama(texts)
+        
+        # encode() sorts texts by length before batching and restores the input
+        # order afterwards, so each batch is padded only to similar lengths
+        embeddings = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+    
+    def _encode_ollama(self, texts: List[str]) -> np.ndarray:
+        """Embed all texts with a single call to Ollama's batch /api/embed endpoint."""
+        response = self._client.post(
+            f"{self.ollama_url}/api/embed",
+            json={"model": self.ollama_model, "input": texts}
+        )
+        response.raise_for_status()
+        
+        embeddings = np.asarray(response.json()["embeddings"], dtype=np.float32)
+        # Normalize so inner-product search stays cosine similarity
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        self.dimension = embeddings.shape[1]
+        return np.ascontiguousarray(embeddings)
 
 
 class OllamaClient:
@@ -56,9 +242,21 @@ class OllamaClient:
         """
         self.base_url = base_url
         self.model = model
+        # Shared async client so requests reuse pooled keep-alive connections
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(
+                max_keepalive_connections=40,
+                max_connections=100,
+                keepalive_expiry=30.0
+            )
+        )
+        # (monotonic timestamp, result) of the last health probe
+        self._health_cache: Optional[Tuple[float, bool]] = None
         logger.info(f"Initialized Ollama client with model: {model}")
     
-    def generate(self, prompt: str, context: List[str] = None) -> str:
+    async def generate(self, prompt: str, context: List[str] = None) -> str:
         """
         Generate response using Ollama.
         
@@ -71,21 +269,21 @@ class OllamaClient:
         """
         try:
             # Check if Ollama is available first
-            if not self.check_health():
-                return "⚠️ Ollama is not available. Please ensure Ollama is installed and running:\n\n1. Install Ollama from https://ollama.ai/\n2. Start Ollama service: 'ollama serve'\n3. Pull a model: 'ollama pull llama2'\n\nOnce Ollama is running, try your query again."
+            if not await self.check_health():
+                return self._unavailable_message()
             
             # Build the full prompt with context
             full_prompt = self._build_prompt(prompt, context)
             
             # Call Ollama API
-            response = requests.post(
+            response = await self._client.post(
                 f"{self.base_url}/api/generate",
-                json={
+                content=orjson.dumps({
                     "model": self.model,
                     "prompt": full_prompt,
                     "stream": False
-                },
-                timeout=60
+                }),
+                headers={"Content-Type": "application/json"}
             )
             
             response.raise_for_status()
@@ -94,31 +292,124 @@ class OllamaClient:
             logger.info("Successfully generated response from Ollama")
             return result.get("response", "")
         
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Error calling Ollama API: {str(e)}")
-            error_msg = f"⚠️ Ollama Error: {str(e)}\n\nPlease ensure:\n1. Ollama is running ('ollama serve')\n2. The model '{self.model}' is available ('ollama pull {self.model}')\n3. Ollama is accessible at {self.base_url}"
-            return error_msg
+            # Re-probe on the next call rather than trusting a stale healthy result
+            self._health_cache = None
+            return self._error_message(e)
+    
+    async def generate_stream(self, prompt: str, context: List[str] = None) -> AsyncIterator[str]:
+        """
+        Generate response using Ollama, yielding text as tokens arrive.
+        
+        Args:
+            prompt: User query
+            context: List of context strings to include
+            
+        Yields:
+            Pieces of the generated response
+        """
+        try:
+            # Check if Ollama is available first
+            if not await self.check_health():
+                yield self._unavailable_message()
+                return
+            
+            # Build the full prompt with context
+            full_prompt = self._build_prompt(prompt, context)
+            
+            # Ollama streams one JSON object per line
+            async with self._client.stream(
+                "POST",
+                f"{self.base_url}/api/generate",
+                content=orjson.dumps({
+                    "model": self.model,
+                    "prompt": full_prompt,
+                    "stream": True
+                }),
+                headers={"Content-Type": "application/json"}
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = orjson.loads(line)
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
+            
+            logger.info("Successfully streamed response from Ollama")
+        
+        except httpx.HTTPError as e:
+            logger.error(f"Error calling Ollama API: {str(e)}")
+            # Re-probe on the next call rather than trusting a stale healthy result
+            self._health_cache = None
+            yield self._error_message(e)
+    
+    def _unavailable_message(self) -> str:
+        """Message returned in place of an answer when Ollama can't be reached."""
+        return "⚠️ Ollama is not available. Please ensure Ollama is installed and running:\n\n1. Install Ollama from https://ollama.ai/\n2. Start Ollama service: 'ollama serve'\n3. Pull a model: 'ollama pull llama2'\n\nOnce Ollama is running, try your query again."
+    
+    def _error_message(self, error: Exception) -> str:
+        """Message returned in place of an answer when an Ollama request fails."""
+        return f"⚠️ Ollama Error: {str(error)}\n\nPlease ensure:\n1. Ollama is running ('ollama serve')\n2. The model '{self.model}' is available ('ollama pull {self.model}')\n3. Ollama is accessible at {self.base_url}"
+    
+    async def generate_many(
+        self,
+        prompts: List[str],
+        context: List[str] = None,
+        concurrency: int = 8
+    ) -> List[str]:
+        """
+        Generate responses for several prompts concurrently.
+        
+        Args:
+            prompts: User queries
+            context: List of context strings to include with every prompt
+            concurrency: Maximum number of requests in flight at once
+            
+        Returns:
+            Generated responses, in the same order as prompts
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def generate_one(prompt: str) -> str:
+            async with semaphore:
+                return await self.generate(prompt, context)
+        
+        return await asyncio.gather(*[generate_one(prompt) for prompt in prompts])
     
     def _build_prompt(self, query: str, context: List[str] = None) -> str:
         """Build prompt with context."""
         if not context:
             return query
         
-        context_text = "\n\n".join(context)
-        prompt = f"""Based on the following context, please answer the question.
-
-Context:
-{context_text}
-
-Question: {query}
-
-Answer:"""
-        return prompt
+        # Single join over all fragments so the context is only copied once
+        parts = ["Based on the following context, please answer the question.\n\nContext:\n"]
+        for chunk in context:
+            parts.append(chunk)
+            parts.append("\n\n")
+        parts.append("Question: ")
+        parts.append(query)
+        parts.append("\n\nAnswer:")
+        return "".join(parts)
     
-    def check_health(self) -> bool:
-        """Check if Ollama is available."""
+    async def check_health(self) -> bool:
+        """Check if Ollama is available, reusing the last result for HEALTH_CHECK_TTL seconds."""
+        now = time.monotonic()
+        if self._health_cache is not None and now - self._health_cache[0] < HEALTH_CHECK_TTL:
+            return self._health_cache[1]
+        
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
+            response = await self._client.get(f"{self.base_url}/api/tags", timeout=5)
+            healthy = response.status_code == 200
         except:
-            return False
+            healthy = False
+        
+        self._health_cache = (now, healthy)
+        return healthy
+    
+    async def close(self):
+        """Close the underlying HTTP connection pool."""
+        await self._client.aclose()
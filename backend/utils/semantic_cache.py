@@ -0,0 +1,73 @@
+import faiss
+import numpy as np
+from typing import Any, List, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """Caches values keyed by embedding similarity instead of exact text."""
+    
+    def __init__(self, dimension: int = 384, threshold: float = 0.97, max_entries: int = 1000):
+        """
+        Initialize the semantic cache.
+        
+        Args:
+            dimension: Dimension of the (normalized) embedding vectors
+            threshold: Minimum cosine similarity for a lookup to count as a hit
+            max_entries: Maximum number of entries before the oldest are evicted
+        """
+        self.dimension = dimension
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # Inner product on normalized vectors is cosine similarity
+        self._index = faiss.IndexFlatIP(dimension)
+        self._values: List[Any] = []
+    
+    def lookup(self, embedding: np.ndarray) -> Optional[Any]:
+        """
+        Find the cached value for the most similar embedding.
+        
+        Args:
+            embedding: Normalized query embedding, 1D or shape (1, dimension)
+        
+        Returns:
+            The cached value on a hit, otherwise None
+        """
+        if self._index.ntotal == 0:
+            return None
+        
+        query_array = np.ascontiguousarray(embedding, dtype=np.float32).reshape(1, -1)
+        scores, indices = self._index.search(query_array, 1)
+        
+        if indices[0][0] < 0 or scores[0][0] < self.threshold:
+            return None
+        
+        logger.info(f"Semantic cache hit (similarity {scores[0][0]:.3f})")
+        return self._values[indices[0][0]]
+    
+    def add(self, embedding: np.ndarray, value: Any):
+        """
+        Store a value under an embedding, evicting the oldest entry when full.
+        
+        Args:
+            embedding: Normalized query embedding, 1D or shape (1, dimension)
+            value: Value to cache
+        """
+        if self._index.ntotal >= self.max_entries:
+            # Flat index removal keeps insertion order, so position 0 is the oldest
+            self._index.remove_ids(faiss.IDSelectorRange(0, 1))
+            self._values.pop(0)
+        
+        self._index.add(np.ascontiguousarray(embedding, dtype=np.float32).reshape(1, -1))
+        self._values.append(value)
+    
+    def clear(self):
+        """Remove all cached entries."""
+        self._index.reset()
+        self._values = []
+    
+    def __len__(self) -> int:
+        return self._index.ntotal
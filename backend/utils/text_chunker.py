@@ -1,10 +1,15 @@
 from typing import List
 import re
 import logging
+import numpy as np
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Runs of whitespace other than newlines, and blank-line paragraph breaks
+_WS_RE = re.compile(r'[^\S\n]+')
+_NL_RE = re.compile(r'\n\s*\n\s*')
+
 
 class TextChunker:
     """Handles text chunking for document processing."""
@@ -37,20 +42,29 @@ class TextChunker:
         paragraphs = text.split('\n\n')
         
         chunks = []
-        current_chunk = ""
+        # Collect pieces of the current chunk and join them once it is full,
+        # rather than growing a string paragraph by paragraph
+        parts: List[str] = []
+        current_len = 0
         
         for paragraph in paragraphs:
             # If adding this paragraph exceeds chunk_size, save current chunk
-            if len(current_chunk) + len(paragraph) > self.chunk_size and current_chunk:
+            if current_len + len(paragraph) > self.chunk_size and current_len:
+                current_chunk = "".join(parts)
                 chunks.append(current_chunk.strip())
                 # Start new chunk with overlap
-                current_chunk = self._get_overlap(current_chunk) + paragraph
+                overlap = self._get_overlap(current_chunk)
+                parts = [overlap, paragraph, "\n\n"]
+                current_len = len(overlap) + len(paragraph) + 2
             else:
-                current_chunk += paragraph + "\n\n"
+                parts.append(paragraph)
+                parts.append("\n\n")
+                current_len += len(paragraph) + 2
         
         # Add the last chunk
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        current_chunk = "".join(parts).strip()
+        if current_chunk:
+            chunks.append(current_chunk)
         
         # If no paragraphs or chunks are too large, use character-based chunking
         if not chunks or any(len(chunk) > self.chunk_size * 1.5 for chunk in chunks):
@@ -61,11 +75,8 @@ class TextChunker:
     
     def _clean_text(self, text: str) -> str:
         """Remove extra whitespace and normalize text."""
-        # Replace multiple spaces with single space
-        text = re.sub(r'\s+', ' ', text)
-        # Replace multiple newlines with double newline
-        text = re.sub(r'\n+', '\n\n', text)
-        return text.strip()
+        # Collapse spaces and tabs, then normalize paragraph breaks to a double newline
+        return _NL_RE.sub('\n\n', _WS_RE.sub(' ', text)).strip()
     
     def _get_overlap(self, text: str) -> str:
         """Get the last chunk_overlap characters from text."""
@@ -75,6 +86,11 @@ class TextChunker:
     
     def _character_based_chunking(self, text: str) -> List[str]:
         """Fallback to simple character-based chunking."""
+        # Find every sentence end and word boundary once, instead of scanning
+        # backwards from each chunk end
+        sentence_ends = np.fromiter((m.start() for m in re.finditer(r'\. ', text)), dtype=np.int64)
+        spaces = np.fromiter((m.start() for m in re.finditer(' ', text)), dtype=np.int64)
+        
         chunks = []
         start = 0
         
@@ -83,17 +99,18 @@ class TextChunker:
             
             # Try to break at a sentence or word boundary
             if end < len(text):
-                # Look for sentence end
-                sentence_end = text.rfind('. ', start, end)
-                if sentence_end > start:
-                    end = sentence_end + 1
+                # Look for the last ". " that fits before end
+                i = np.searchsorted(sentence_ends, end - 2, side='right') - 1
+                if i >= 0 and sentence_ends[i] > start:
+                    end = int(sentence_ends[i]) + 1
                 else:
                     # Look for word boundary
-                    space = text.rfind(' ', start, end)
-                    if space > start:
-                        end = space
+                    i = np.searchsorted(spaces, end - 1, side='right') - 1
+                    if i >= 0 and spaces[i] > start:
+                        end = int(spaces[i])
             
             chunks.append(text[start:end].strip())
-            start = end - self.chunk_overlap if end < len(text) else end
+            # Always move forward, even when a boundary sits within the overlap
+            start = max(end - self.chunk_overlap, start + 1) if end < len(text) else end
         
         return chunks
@@ -1,38 +1,118 @@
 import faiss
 import numpy as np
+import orjson
 import pickle
 import os
-from typing import List, Dict, Any
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Union
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Supported index_type values; "auto" uses float16 brute force for small
+# collections and switches to HNSW once they reach HNSW_THRESHOLD vectors
+INDEX_TYPES = ("auto", "flat", "fp16", "sq8", "hnsw", "ivfpq")
+
+# Collections at or above this size switch from brute-force search to HNSW
+HNSW_THRESHOLD = 10000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# IVF-PQ settings; FAISS wants roughly 39 training vectors per IVF list,
+# so smaller collections stay on the flat index
+IVF_NLIST = 1024
+# Target dimensions per PQ sub-quantizer (384 dims -> 48 sub-quantizers)
+IVF_PQ_SUB_DIM = 8
+IVF_NPROBE = 8
+IVF_MIN_TRAIN = 39 * IVF_NLIST
+
+# The int8 scalar quantizer learns a value range per dimension, which a small
+# first batch can't estimate, so "sq8" collections stay on the flat index
+# until they have SQ_MIN_TRAIN vectors; the learned range is widened by
+# SQ_RANGE_MARGIN on each side for vectors added later
+SQ_MIN_TRAIN = 1000
+SQ_RANGE_MARGIN = 0.1
+
+# With binary rerank enabled, this many times n_results candidates are taken
+# from the Hamming-distance search before exact rescoring
+BINARY_RERANK_FACTOR = 4
+
+# Added chunks are written to disk at most this many seconds after the first
+# unsaved add; flush() writes them immediately
+SAVE_INTERVAL = 30.0
+
 
 class VectorStore:
-    """Manages vector database operations using FAISS."""
+    """
+    Manages vector database operations using FAISS.
+    
+    Embeddings are expected to be L2-normalized, so inner-product search
+    ranks by cosine similarity.
+    """
     
-    def __init__(self, persist_directory: str = "./faiss_db", collection_name: str = "documents"):
+    def __init__(
+        self,
+        persist_directory: str = "./faiss_db",
+        collection_name: str = "documents",
+        dimension: int = 384,
+        index_type: str = "auto",
+        binary_rerank: bool = False
+    ):
         """
         Initialize the vector store.
         
         Args:
             persist_directory: Directory to persist the database
             collection_name: Name of the collection to use
+            dimension: Dimension of the embedding vectors
+            index_type: One of INDEX_TYPES; controls which FAISS index new data goes into
+            binary_rerank: Search a sign-bit binary index first and rescore its
+                candidates exactly against the main index
         """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        
         self.persist_directory = persist_directory
         self.collection_name = collection_name
+        self.index_type = index_type
         self.index_path = os.path.join(persist_directory, f"{collection_name}.index")
-        self.metadata_path = os.path.join(persist_directory, f"{collection_name}.pkl")
+        self.metadata_path = os.path.join(persist_directory, f"{collection_name}.meta.json")
+        # Metadata files written with pickle by older versions; converted on load
+        self.legacy_metadata_path = os.path.join(persist_directory, f"{collection_name}.pkl")
+        # Append-only log of chunks added since metadata_path was last written
+        self.log_path = os.path.join(persist_directory, f"{collection_name}.log.jsonl")
+        # Raw packed sign-bit codes for binary rerank, one row per index position
+        self.bin_path = os.path.join(persist_directory, f"{collection_name}.bin")
+        # Small sidecar with the vector count, so listing collections needn't load indexes
+        self.info_path = os.path.join(persist_directory, f"{collection_name}.info.json")
         
         # Create directory if it doesn't exist
         os.makedirs(persist_directory, exist_ok=True)
         
         # Initialize or load index
-        self.dimension = 384  # Default dimension for all-MiniLM-L6-v2
+        self.dimension = dimension  # 384 is the dimension of all-MiniLM-L6-v2
         self.index = None
+        # True while self.index is a read-only memory mapping of index_path
+        self._index_mapped = False
+        self.binary_rerank = binary_rerank
+        self.bin_index = None
         self.metadata_store = []
         self.document_store = []
+        # Maps document_id -> positions of its chunks in metadata_store
+        self._doc_index: Dict[str, List[int]] = defaultdict(list)
+        # Object-array copies of document_store/metadata_store for vectorized
+        # lookups; rebuilt on the first query after the stores change
+        self._lookup: Optional[tuple] = None
+        # True once metadata_path holds the snapshot this instance's stores extend,
+        # i.e. it was loaded or written here; only then may flush() append to the log
+        self._snapshot_current = False
+        # Position of the first chunk not yet on disk (None when fully saved)
+        self._pending_start: Optional[int] = None
+        self._dirty_since: Optional[float] = None
         
         self._load_index()
         
@@ -59,6 +139,15 @@ class VectorStore:
         collections = VectorStore.list_collections(persist_directory)
         
         for collection_name in collections:
+            info_path = os.path.join(persist_directory, f"{collection_name}.info.json")
+            try:
+                with open(info_path, 'rb') as f:
+                    collections_info[collection_name] = orjson.loads(f.read())["ntotal"]
+                continue
+            except (OSError, orjson.JSONDecodeError, KeyError):
+                # Collections saved before the sidecar existed are loaded instead
+                pass
+            
             try:
                 vs = VectorStore(persist_directory, collection_name)
                 collections_info[collection_name] = vs.get_collection_count()
@@ -70,72 +159,436 @@ class VectorStore:
     
     def _load_index(self):
         """Load existing index or create new one."""
-        if os.path.exists(self.index_path) and os.path.exists(self.metadata_path):
+        legacy = not os.path.exists(self.metadata_path) and os.path.exists(self.legacy_metadata_path)
+        if os.path.exists(self.index_path) and (legacy or os.path.exists(self.metadata_path)):
             try:
-                self.index = faiss.read_index(self.index_path)
-                with open(self.metadata_path, 'rb') as f:
-                    data = pickle.load(f)
-                    self.metadata_store = data.get('metadata', [])
-                    self.document_store = data.get('documents', [])
+                self._read_index_mapped()
+                if legacy:
+                    with open(self.legacy_metadata_path, 'rb') as f:
+                        data = pickle.load(f)
+                else:
+                    with open(self.metadata_path, 'rb') as f:
+                        data = orjson.loads(f.read())
+                self.metadata_store = data.get('metadata', [])
+                self.document_store = data.get('documents', [])
+                self._snapshot_current = not legacy
+                self._replay_log()
+                if legacy:
+                    self._save_index()
+                    os.remove(self.legacy_metadata_path)
+                    logger.info(f"Converted metadata of collection {self.collection_name} from pickle to JSON")
+                self._rebuild_doc_index()
+                self.dimension = self.index.d
                 logger.info(f"Loaded existing index with {self.index.ntotal} vectors")
+                
+                if self.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+                    self._migrate_to_inner_product()
+                self._rebuild_binary_index()
             except Exception as e:
                 logger.warning(f"Failed to load index: {e}. Creating new index.")
                 self._create_new_index()
         else:
             self._create_new_index()
     
+    def _read_index_mapped(self):
+        """Read the saved index, memory-mapping it where FAISS supports that."""
+        try:
+            # IVF inverted lists are mapped from disk and paged in on demand; index
+            # types without mmap support are read into memory as usual
+            self.index = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            self._index_mapped = True
+        except RuntimeError as e:
+            logger.info(f"Memory-mapped load unavailable ({e}); reading index into memory")
+            self.index = faiss.read_index(self.index_path)
+            self._index_mapped = False
+    
+    def _ensure_writable(self):
+        """Replace a read-only mapped index with an in-memory copy before modifying it."""
+        if self._index_mapped:
+            # Nothing has changed since the mapped load, so the file is still current
+            self.index = faiss.read_index(self.index_path)
+            self._index_mapped = False
+            logger.info(f"Loaded writable index for collection {self.collection_name}")
+    
+    def _replay_log(self):
+        """Append chunks recorded in the add log after the last full metadata save."""
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # A crash mid-write leaves a partial last line
+                        logger.warning(f"Ignoring truncated entry in {self.log_path}")
+                        break
+                    # Skip entries already covered by the metadata file
+                    if entry["position"] == len(self.metadata_store):
+                        self.metadata_store.append(entry["metadata"])
+                        self.document_store.append(entry["document"])
+        
+        # The log is written before the index, so it can only run ahead of it
+        if len(self.metadata_store) > self.index.ntotal:
+            logger.warning(f"Dropping {len(self.metadata_store) - self.index.ntotal} chunks missing from the saved index")
+            del self.metadata_store[self.index.ntotal:]
+            del self.document_store[self.index.ntotal:]
+    
+    def _migrate_to_inner_product(self):
+        """Rebuild an index saved with L2 distance as an inner-product index."""
+        vectors = self._all_vectors()
+        faiss.normalize_L2(vectors)
+        self.index = self._build_index(vectors)
+        self._index_mapped = False
+        self._save_index()
+        logger.info(f"Migrated collection {self.collection_name} to inner-product index")
+    
     def _create_new_index(self):
         """Create a new FAISS index."""
-        self.index = faiss.IndexFlatL2(self.dimension)
+        self.index = self._build_index(np.empty((0, self.dimension), dtype=np.float32))
+        self._index_mapped = False
+        self._snapshot_current = False
         self.metadata_store = []
         self.document_store = []
+        self._doc_index = defaultdict(list)
+        self._lookup = None
+        self._rebuild_binary_index()
+    
+    def _rebuild_binary_index(self):
+        """Rebuild the sign-bit binary index from the main index, if enabled."""
+        if not self.binary_rerank:
+            return
+        if self.dimension % 8:
+            logger.warning(f"Binary rerank needs a dimension divisible by 8, got {self.dimension}; disabling it")
+            self.binary_rerank = False
+            return
+        self.bin_index = faiss.IndexBinaryFlat(self.dimension)
+        if self.index.ntotal:
+            codes = self._read_binary_codes()
+            if codes is not None:
+                self.bin_index.add(codes)
+            else:
+                self.bin_index.add(self._binarize(self._all_vectors()))
+                self._write_binary_codes()
+    
+    def _read_binary_codes(self) -> Optional[np.ndarray]:
+        """Read the saved binary codes, or return None if they don't match the index."""
+        code_size = self.dimension // 8
+        if not os.path.exists(self.bin_path) or os.path.getsize(self.bin_path) != self.index.ntotal * code_size:
+            return None
+        # IndexBinaryFlat copies added codes, so read them straight into memory
+        return np.fromfile(self.bin_path, dtype=np.uint8).reshape(self.index.ntotal, code_size)
+    
+    def _write_binary_codes(self, start: int = 0):
+        """Write binary codes from position start onwards, appending when start > 0."""
+        if self.bin_index is None:
+            # Codes on disk would go stale while binary rerank is off
+            if os.path.exists(self.bin_path):
+                os.remove(self.bin_path)
+            return
+        # Take the codes from the binary index itself; re-binarizing vectors
+        # reconstructed from a lossy (SQ or PQ) index would give different bits
+        codes = faiss.vector_to_array(self.bin_index.xb)[start * self.bin_index.code_size:]
+        with open(self.bin_path, 'ab' if start else 'wb') as f:
+            f.write(codes.tobytes())
+    
+    @staticmethod
+    def _binarize(vectors: np.ndarray) -> np.ndarray:
+        """Pack the sign bit of every component into a uint8 code array."""
+        return np.packbits(vectors > 0, axis=1)
+    
+    def _binary_search_rerank(self, query_array: np.ndarray, n_results: int):
+        """Find candidates by Hamming distance, then rescore them with exact inner products."""
+        n_candidates = min(n_results * BINARY_RERANK_FACTOR, self.bin_index.ntotal)
+        _, candidates = self.bin_index.search(self._binarize(query_array), n_candidates)
+        
+        self._ensure_reconstructable()
+        distances = np.empty((len(query_array), n_results), dtype=np.float32)
+        indices = np.empty((len(query_array), n_results), dtype=np.int64)
+        for row, (query, ids) in enumerate(zip(query_array, candidates)):
+            scores = self.index.reconstruct_batch(ids) @ query
+            top = np.argsort(-scores)[:n_results]
+            distances[row] = scores[top]
+            indices[row] = ids[top]
+        return distances, indices
+    
+    def _index_kind_for(self, n: int) -> str:
+        """Pick "flat", "fp16", "sq8", "hnsw" or "ivfpq" for a collection of n vectors."""
+        if self.index_type in ("fp16", "hnsw"):
+            return self.index_type
+        if self.index_type == "sq8":
+            return "sq8" if n >= SQ_MIN_TRAIN else "flat"
+        if self.index_type == "ivfpq":
+            return "ivfpq" if n >= IVF_MIN_TRAIN else "flat"
+        if self.index_type == "auto":
+            return "hnsw" if n >= HNSW_THRESHOLD else "fp16"
+        return "flat"
+    
+    def _build_index(self, vectors: np.ndarray):
+        """Build the index type that suits the given vectors and add them to it."""
+        kind = self._index_kind_for(len(vectors))
+        d = vectors.shape[1]
+        if kind == "ivfpq":
+            index = faiss.index_factory(d, f"IVF{IVF_NLIST},PQ{self._pq_subquantizers(d)}", faiss.METRIC_INNER_PRODUCT)
+            index.train(vectors)
+            index.nprobe = IVF_NPROBE
+        elif kind == "fp16":
+            # Half-precision codes halve the memory scanned per query; fp16 needs no training
+            index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+        elif kind == "sq8":
+            index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+            index.sq.rangestat = faiss.ScalarQuantizer.RS_minmax
+            index.sq.rangestat_arg = SQ_RANGE_MARGIN
+            index.train(vectors)
+        elif kind == "hnsw":
+            index = faiss.IndexHNSWFlat(d, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        else:
+            index = faiss.IndexFlatIP(d)
+        if len(vectors):
+            index.add(vectors)
+        return index
+    
+    def _needs_upgrade(self, n: int) -> bool:
+        """Check whether a brute-force index should be rebuilt as another kind at n vectors."""
+        new_kind = self._index_kind_for(n)
+        if not self._is_flat() or new_kind in ("flat", "fp16"):
+            return False
+        # sq8 is brute force too, but only built once there is enough training data
+        return new_kind != "sq8" or not isinstance(self.index, faiss.IndexScalarQuantizer)
+    
+    @staticmethod
+    def _pq_subquantizers(d: int) -> int:
+        """Pick the PQ sub-quantizer count; it has to divide the dimension d."""
+        m = max(1, d // IVF_PQ_SUB_DIM)
+        while d % m:
+            m -= 1
+        return m
+    
+    def _remove_ivf_positions(self, indices: List[int]):
+        """
+        Remove sorted positions from an IVF index and renumber the remaining ids.
+        
+        Keeps the trained coarse quantizer and PQ codebooks, so deleting a
+        document doesn't re-run k-means over the whole collection.
+        """
+        removed = np.array(indices, dtype=np.int64)
+        ivf = faiss.extract_index_ivf(self.index)
+        # remove_ids doesn't support the array direct map; it is rebuilt on demand
+        ivf.make_direct_map(False)
+        self.index.remove_ids(faiss.IDSelectorBatch(removed))
+        
+        # IVF ids are positions, so shift every id past a removed one down
+        invlists = ivf.invlists
+        for list_no in range(ivf.nlist):
+            size = invlists.list_size(list_no)
+            if size == 0:
+                continue
+            ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size).copy()
+            new_ids = ids - np.searchsorted(removed, ids)
+            if np.array_equal(ids, new_ids):
+                continue
+            codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size).copy()
+            invlists.update_entries(list_no, 0, size, faiss.swig_ptr(new_ids), faiss.swig_ptr(codes))
+    
+    def _is_flat(self) -> bool:
+        """Check whether the current index is a brute-force (flat or scalar-quantized) index."""
+        # Flat and scalar-quantized indexes both store one plain code per position.
+        # Growing collections upgrade from these to an ANN index, and their
+        # remove_ids compacts the code array in position order, which keeps
+        # positions aligned with metadata_store on delete
+        return isinstance(self.index, faiss.IndexFlatCodes)
+    
+    def _search_params(self, n_results: int, nprobe: Optional[int] = None):
+        """Get per-call search parameters for ANN indexes, or None for flat ones."""
+        # Per-call params keep concurrent queries from racing on shared index settings
+        if isinstance(self.index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(efSearch=max(HNSW_EF_SEARCH, n_results))
+        if faiss.try_extract_index_ivf(self.index) is not None:
+            return faiss.SearchParametersIVF(nprobe=nprobe or IVF_NPROBE)
+        return None
+    
+    def _ensure_reconstructable(self):
+        """Make sure stored vectors can be reconstructed from the main index."""
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None and ivf.direct_map.no():
+            # IVF indexes need a direct map before vectors can be reconstructed
+            ivf.make_direct_map()
+    
+    def _all_vectors(self) -> np.ndarray:
+        """Get every vector stored in the index, in position order."""
+        self._ensure_reconstructable()
+        return self.index.reconstruct_n(0, self.index.ntotal)
+    
+    def _lookup_arrays(self) -> tuple:
+        """Get (documents, metadatas) as object arrays aligned with index positions."""
+        if self._lookup is None:
+            documents = np.empty(len(self.document_store), dtype=object)
+            documents[:] = self.document_store
+            metadatas = np.empty(len(self.metadata_store), dtype=object)
+            metadatas[:] = self.metadata_store
+            self._lookup = (documents, metadatas)
+        return self._lookup
+    
+    def _rebuild_doc_index(self):
+        """Rebuild the document_id -> chunk positions index from metadata_store."""
+        self._doc_index = defaultdict(list)
+        for i, metadata in enumerate(self.metadata_store):
+            self._doc_index[metadata.get("document_id", "unknown")].append(i)
+    
+    def get_document_indices(self, document_id: str) -> List[int]:
+        """Get the metadata_store positions of all chunks for a document."""
+        return self._doc_index.get(document_id, [])
+    
+    def get_document_ids(self) -> List[str]:
+        """Get the IDs of all documents in the collection."""
+        return list(self._doc_index.keys())
+    
+    def _write_index(self):
+        """Write the index file atomically."""
+        # Replacing the file instead of rewriting it in place leaves any existing
+        # memory mapping of the old file valid
+        tmp_path = f"{self.index_path}.tmp"
+        faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+        with open(self.info_path, 'wb') as f:
+            f.write(orjson.dumps({"ntotal": self.index.ntotal, "dim": self.dimension}))
     
     def _save_index(self):
-        """Save index and metadata to disk."""
+        """Save index and all metadata to disk."""
         try:
-            faiss.write_index(self.index, self.index_path)
+            self._write_index()
+            self._write_binary_codes()
             with open(self.metadata_path, 'wb') as f:
-                pickle.dump({
+                f.write(orjson.dumps({
                     'metadata': self.metadata_store,
                     'documents': self.document_store
-                }, f)
+                }))
+            # Everything in the log is now in the metadata file
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            self._snapshot_current = True
+            self._pending_start = None
+            self._dirty_since = None
             logger.info("Saved index to disk")
         except Exception as e:
             logger.error(f"Error saving index: {str(e)}")
             raise
     
+    def flush(self):
+        """Write chunks added since the last save to disk."""
+        if self._pending_start is None:
+            return
+        if not self._snapshot_current:
+            # A file left over from before a failed load or reset doesn't hold
+            # the chunks these positions build on, so write a full snapshot
+            self._save_index()
+            return
+        
+        try:
+            # Only the new chunks are appended, instead of rewriting every chunk
+            with open(self.log_path, 'ab') as f:
+                for position in range(self._pending_start, len(self.metadata_store)):
+                    f.write(orjson.dumps({
+                        "position": position,
+                        "metadata": self.metadata_store[position],
+                        "document": self.document_store[position]
+                    }) + b"\n")
+            self._write_index()
+            self._write_binary_codes(self._pending_start)
+            logger.info(f"Flushed {len(self.metadata_store) - self._pending_start} chunks to disk")
+            self._pending_start = None
+            self._dirty_since = None
+        except Exception as e:
+            logger.error(f"Error flushing index: {str(e)}")
+            raise
+    
+    def flush_if_stale(self, max_age: float = SAVE_INTERVAL):
+        """Flush if unsaved chunks have been pending for at least max_age seconds."""
+        if self._dirty_since is not None and time.monotonic() - self._dirty_since >= max_age:
+            self.flush()
+    
+    def build_upgraded_index(self, embeddings: np.ndarray):
+        """
+        Build the index that adding these embeddings switches to, if any.
+        
+        Training IVF-PQ or building an HNSW graph takes seconds to minutes, so
+        this only reads the current index and can run in a worker thread while
+        searches continue; pass the result to add_documents.
+        
+        Args:
+            embeddings: 2D float32 array of the embeddings about to be added
+            
+        Returns:
+            The upgraded index holding every stored and new vector, or None
+        """
+        embeddings_array = np.ascontiguousarray(embeddings, dtype=np.float32)
+        n = self.index.ntotal + len(embeddings_array)
+        if not self._needs_upgrade(n):
+            return None
+        if self.index.ntotal == 0:
+            # The new embeddings may not match the guessed dimension of an empty index
+            return self._build_index(embeddings_array)
+        return self._build_index(np.vstack([self._all_vectors(), embeddings_array]))
+    
     def add_documents(
         self,
         texts: List[str],
-        embeddings: List[List[float]],
+        embeddings: Union[np.ndarray, List[List[float]]],
         metadata: List[Dict[str, Any]] = None,
-        ids: List[str] = None
+        ids: List[str] = None,
+        upgraded_index=None
     ):
         """
         Add documents to the vector store.
         
         Args:
             texts: List of text chunks
-            embeddings: List of embedding vectors
+            embeddings: 2D float32 array of embedding vectors; nested lists are converted
             metadata: Optional metadata for each chunk
             ids: Optional IDs for each chunk
+            upgraded_index: Result of build_upgraded_index for these embeddings,
+                if it was prepared ahead of time
         """
         try:
-            # Convert embeddings to numpy array
-            embeddings_array = np.array(embeddings, dtype=np.float32)
+            # FAISS needs C-contiguous float32; no copy if already in that layout
+            embeddings_array = np.ascontiguousarray(embeddings, dtype=np.float32)
+            self._ensure_writable()
+            
+            if self.index.ntotal == 0 and embeddings_array.shape[1] != self.dimension:
+                # The dimension given for a new collection is only a guess when the
+                # embedding model hasn't been probed yet; an empty index can adopt it
+                self.dimension = embeddings_array.shape[1]
+                self._create_new_index()
             
-            # Add to FAISS index
-            self.index.add(embeddings_array)
+            # Add to FAISS index, switching to a trained or ANN index once the
+            # collection is large enough
+            if self._needs_upgrade(self.index.ntotal + len(embeddings_array)):
+                if upgraded_index is None or upgraded_index.ntotal != self.index.ntotal + len(embeddings_array):
+                    upgraded_index = self._build_index(np.vstack([self._all_vectors(), embeddings_array]))
+                self.index = upgraded_index
+                logger.info(f"Switched collection {self.collection_name} to {self._index_kind_for(self.index.ntotal)} index")
+            else:
+                self.index.add(embeddings_array)
+            
+            if self.bin_index is not None:
+                self.bin_index.add(self._binarize(embeddings_array))
             
             # Store documents and metadata
             self.document_store.extend(texts)
             
             if metadata is None:
                 metadata = [{"text": text} for text in texts]
+            start = len(self.metadata_store)
             self.metadata_store.extend(metadata)
+            for i, meta in enumerate(metadata, start):
+                self._doc_index[meta.get("document_id", "unknown")].append(i)
+            self._lookup = None
             
-            # Save to disk
-            self._save_index()
+            # Defer the disk write; it happens on flush() or once the oldest
+            # unsaved add is SAVE_INTERVAL seconds old
+            if self._pending_start is None:
+                self._pending_start = start
+                self._dirty_since = time.monotonic()
+            self.flush_if_stale()
             
             logger.info(f"Added {len(texts)} documents to vector store")
         
@@ -145,50 +598,179 @@ class VectorStore:
     
     def query(
         self,
-        query_embedding: List[float],
-        n_results: int = 5
+        query_embedding: np.ndarray,
+        n_results: int = 5,
+        nprobe: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Query the vector store.
         
         Args:
-            query_embedding: Embedding vector of the query
+            query_embedding: Embedding vector of the query, 1D or shape (1, dimension)
             n_results: Number of results to return
+            nprobe: Number of IVF lists to visit (IVF-PQ indexes only)
+            
+        Returns:
+            Dictionary with 'documents', 'metadatas' and 'distances' lists,
+            best match first
+        """
+        return self.query_batch(query_embedding, n_results, nprobe)[0]
+    
+    def query_batch(
+        self,
+        query_embeddings: np.ndarray,
+        n_results: int = 5,
+        nprobe: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Query the vector store with several queries in a single search call.
+        
+        Args:
+            query_embeddings: 2D array with one query embedding per row
+            n_results: Number of results to return per query
+            nprobe: Number of IVF lists to visit (IVF-PQ indexes only)
             
         Returns:
-            Dictionary containing results
+            List of result dictionaries, one per query, in input order
         """
         try:
-            if self.index.ntotal == 0:
-                return {
-                    'documents': [[]],
-                    'metadatas': [[]],
-                    'distances': [[]]
-                }
+            # Convert queries to a 2D float32 array
+            query_array = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+            query_array = query_array.reshape(-1, query_array.shape[-1])
             
-            # Convert query to numpy array
-            query_array = np.array([query_embedding], dtype=np.float32)
+            if self.index.ntotal == 0:
+                return [
+                    {
+                        'documents': [],
+                        'metadatas': [],
+                        'distances': []
+                    }
+                    for _ in range(len(query_array))
+                ]
             
             # Search
             n_results = min(n_results, self.index.ntotal)
-            distances, indices = self.index.search(query_array, n_results)
+            params = self._search_params(n_results, nprobe)
+            if self.bin_index is not None:
+                distances, indices = self._binary_search_rerank(query_array, n_results)
+            elif params is not None:
+                distances, indices = self.index.search(query_array, n_results, params=params)
+            else:
+                distances, indices = self.index.search(query_array, n_results)
+            
+            # Gather documents and metadata for every query at once; unfilled (-1)
+            # slots gather an arbitrary row and are masked out below
+            documents, metadatas = self._lookup_arrays()
+            hit_documents = documents.take(indices, mode='wrap')
+            hit_metadatas = metadatas.take(indices, mode='wrap')
+            filled = indices >= 0
             
-            # Retrieve documents and metadata
-            retrieved_docs = [self.document_store[i] for i in indices[0]]
-            retrieved_metadata = [self.metadata_store[i] for i in indices[0]]
+            results = []
+            for row, mask in enumerate(filled):
+                results.append({
+                    'documents': hit_documents[row][mask].tolist(),
+                    'metadatas': hit_metadatas[row][mask].tolist(),
+                    'distances': distances[row][mask].tolist()
+                })
             
-            logger.info(f"Retrieved {n_results} results from vector store")
+            logger.info(f"Retrieved {n_results} results for {len(query_array)} queries from vector store")
             
-            return {
-                'documents': [retrieved_docs],
-                'metadatas': [retrieved_metadata],
-                'distances': distances.tolist()
-            }
+            return results
         
         except Exception as e:
             logger.error(f"Error querying vector store: {str(e)}")
             raise
     
+    def build_index_without(self, indices: List[int]):
+        """
+        Build a copy of the index without the given positions, if deleting needs a rebuild.
+        
+        Only reads the current index, so it can run in a worker thread while
+        searches continue; pass the result to delete_document.
+        
+        Args:
+            indices: Sorted positions that will be deleted
+            
+        Returns:
+            The rebuilt index, or None if the index can delete in place
+        """
+        if faiss.try_extract_index_ivf(self.index) is not None or self._is_flat():
+            return None
+        # HNSW graphs can't drop nodes, so build a new one from the kept vectors
+        return self._build_index(np.delete(self._all_vectors(), indices, axis=0))
+    
+    def delete_document(self, document_id: str, rebuilt_index=None) -> int:
+        """
+        Delete all chunks of a document from the vector store.
+        
+        Args:
+            document_id: ID of the document to delete
+            rebuilt_index: Result of build_index_without for this document's
+                positions, if it was prepared ahead of time
+            
+        Returns:
+            Number of chunks deleted
+        """
+        try:
+            indices = sorted(self.get_document_indices(document_id))
+            if not indices:
+                return 0
+            
+            if len(indices) == len(self.metadata_store):
+                # No remaining documents, reset collection
+                self.reset_collection()
+                return len(indices)
+            
+            self._ensure_writable()
+            if faiss.try_extract_index_ivf(self.index) is not None:
+                self._remove_ivf_positions(indices)
+            elif not self._is_flat():
+                if rebuilt_index is None or rebuilt_index.ntotal != self.index.ntotal - len(indices):
+                    rebuilt_index = self.build_index_without(indices)
+                self.index = rebuilt_index
+            else:
+                # Native batch removal; flat and SQ indexes compact remaining vectors
+                # in order, so positions stay aligned with metadata_store
+                self.index.remove_ids(faiss.IDSelectorBatch(np.array(indices, dtype=np.int64)))
+            
+            if self.bin_index is not None:
+                # The binary flat index also compacts in position order
+                self.bin_index.remove_ids(faiss.IDSelectorBatch(np.array(indices, dtype=np.int64)))
+            
+            # Drop rows in contiguous runs from the end so earlier positions stay valid
+            for start, end in reversed(self._contiguous_runs(indices)):
+                del self.metadata_store[start:end]
+                del self.document_store[start:end]
+            self._lookup = None
+            
+            # Only documents stored after the first deleted row move down
+            del self._doc_index[document_id]
+            for positions in self._doc_index.values():
+                if positions[-1] > indices[0]:
+                    positions[:] = [p - bisect_left(indices, p) for p in positions]
+            
+            self._save_index()
+            
+            logger.info(f"Deleted {len(indices)} chunks of document {document_id}")
+            return len(indices)
+        
+        except Exception as e:
+            logger.error(f"Error deleting document from vector store: {str(e)}")
+            raise
+    
+    @staticmethod
+    def _contiguous_runs(indices: List[int]) -> List[tuple]:
+        """Group sorted positions into (start, end) half-open ranges."""
+        runs = []
+        start = prev = indices[0]
+        for i in indices[1:]:
+            if i != prev + 1:
+                runs.append((start, prev + 1))
+                start = i
+            prev = i
+        runs.append((start, prev + 1))
+        return runs
+    
     def get_collection_count(self) -> int:
         """Get the number of documents in the collection."""
         try:
@@ -204,6 +786,15 @@ class VectorStore:
                 os.remove(self.index_path)
             if os.path.exists(self.metadata_path):
                 os.remove(self.metadata_path)
+            self._snapshot_current = False
+            if os.path.exists(self.legacy_metadata_path):
+                os.remove(self.legacy_metadata_path)
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            if os.path.exists(self.bin_path):
+                os.remove(self.bin_path)
+            if os.path.exists(self.info_path):
+                os.remove(self.info_path)
             logger.info(f"Deleted collection: {self.collection_name}")
         except Exception as e:
             logger.error(f"Error deleting collection: {str(e)}")